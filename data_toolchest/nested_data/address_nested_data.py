@@ -1,9 +1,22 @@
 """Tools to parse and index all values in nested data structures."""
 import json
+import mmap
+import re
 import sys
 
-from pathlib import Path, PurePath
-from typing  import Iterator, List, NamedTuple, Tuple, Union
+from itertools import repeat
+from pathlib   import Path, PurePath
+from typing    import Any, BinaryIO, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+try:
+    import ijson  # type: ignore
+except ImportError:  # pragma: no cover
+    ijson = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
 
 Keys       = Union[int, str]
 JsonValues = Union[bool, dict, float, int, list, None, str]
@@ -13,6 +26,33 @@ Values     = Union[bool, float, int, None, str]
 
 AddressedValue = NamedTuple('AddressedValue', [('address', Address), ('value', Values)])
 
+# Files at least this large are stream parsed (when ijson is installed) rather than loaded whole.  Streaming takes two
+# ijson passes, so it is kept for files whose decoded tree would be too large to hold; smaller ones decode far faster.
+_STREAM_MIN_BYTES = 64 * 1024 * 1024
+
+# \uD800-\uDFFF escapes.  ijson's yajl backend decodes unpaired ones to '?', where json keeps the lone surrogate.
+_SURROGATE_ESCAPE = re.compile(rb'\\u[dD][89a-fA-F]')
+
+# Integer tokens of 19+ digits, the only ones that may fall outside orjson's int range [-2**63, 2**64 - 1].  orjson
+# silently decodes those as floats, where json keeps them exact.  Digits in fractions and exponents are not matched.
+_LONG_INT = re.compile(rb'(?<![0-9.eE+-])-?[0-9]{19,}(?![.eE0-9])')
+_ORJSON_INT_MIN = -2 ** 63
+_ORJSON_INT_MAX = 2 ** 64 - 1
+
+# Digit runs are first located with bytes.find over a copy of the data with all digits zeroed, which is many times
+# faster than running _LONG_INT over the whole document.  Copies are made a chunk at a time.
+_ZERO_DIGITS    = bytes.maketrans(b'123456789', b'000000000')
+_LONG_DIGIT_RUN = b'0' * 19
+_DIGITS         = frozenset(b'0123456789')
+_SCAN_BYTES     = 1024 * 1024
+
+# Files at least this large are decoded straight from a read-only memory map, when the decoder accepts buffers.
+_MMAP_MIN_BYTES = 1024 * 1024
+
+# Types of json non-iterables.  Decoders produce exactly these (never subclasses), so the walk matches them first.
+_LEAF_BASES = (bool, float, int, str, type(None))
+_LEAF_TYPES = frozenset(_LEAF_BASES)
+
 
 # TODO: look into parsers to address other nested data structures based on input file suffix.
 
@@ -23,6 +63,12 @@ def address_json(jsonfile: Union[str, PurePath]) -> Iterator[AddressedValue]:
     Extract the unique container index addresses (tuple of property names and/or array indicies) for each
     non-iterable JSON values (i.e. object or array).
 
+    Files of _STREAM_MIN_BYTES or more are stream parsed with ijson, if installed, so the full json tree is never
+    held in memory: a first pass checks the stream parser addresses the file as decoding it whole would, and a
+    second lazily yields its addressed values.  Smaller files, and any file the stream parser would address
+    differently, are decoded whole with orjson (from a memory map for files of _MMAP_MIN_BYTES or more), falling
+    back to the standard json module.  Either way a document yields the same addressed values.
+
     Args:
         jsonfile: Path to input json file.
 
@@ -30,39 +76,197 @@ def address_json(jsonfile: Union[str, PurePath]) -> Iterator[AddressedValue]:
         AddressedValue objectsSet of non-iterable json values with dictionary/list index address tuples.
 
     """
-    with open(Path(jsonfile), 'r') as j:
-        j_dict = json.load(j)
+    jsonfile = Path(jsonfile)
+    size = jsonfile.stat().st_size
+    if ijson is not None and size >= _STREAM_MIN_BYTES and _streams_like_decoding(jsonfile):
+        with open(jsonfile, 'rb') as jb:
+            yield from stream_drilldown(jb)
+        return
+
+    j_dict = _load_json(jsonfile, size)
+    # tuple.__new__ mapped over the (address, value) pairs builds each namedtuple in C, skipping the Python-level
+    # AddressedValue.__new__ call per leaf.
+    yield from map(tuple.__new__, repeat(AddressedValue), value_drilldown((), j_dict))
+
+
+def _streams_like_decoding(jsonfile: Path) -> bool:
+    """Check, in one streaming pass, that stream_drilldown addresses a json file exactly as decoding it whole would.
+
+    Only property names of the open objects are held, so memory stays far below that of the decoded json tree.
+
+    Returns:
+        False if the file must be decoded whole instead: ijson handles duplicate property names, numbers beyond 64
+        bits or float range, NaN/Infinity, surrogate escapes and invalid json differently than the json module.
+
+    """
+    names: List[Set[str]] = []  # property names seen so far in each open object
+    with open(jsonfile, 'rb') as jb:
+        scanned = _SurrogateEscapeScan(jb)
+        try:
+            for _, event, value in ijson.parse(scanned, use_float=True):
+                if event == 'map_key':
+                    if value in names[-1]:
+                        return False
+                    names[-1].add(value)
+                elif event == 'start_map':
+                    names.append(set())
+                elif event == 'end_map':
+                    names.pop()
+        except ijson.JSONError:
+            return False
+    return not scanned.found
+
+
+class _SurrogateEscapeScan:
+    """Binary file reader noting whether a \\uD800-\\uDFFF escape passes through read(), which then ends the stream."""
+
+    def __init__(self, jb: BinaryIO) -> None:
+        self._jb = jb
+        self._tail = b''
+        self.found = False
+
+    def read(self, size: int = -1) -> bytes:
+        if self.found:
+            return b''
+        chunk = self._jb.read(size)
+        if _SURROGATE_ESCAPE.search(chunk) or _SURROGATE_ESCAPE.search(self._tail + chunk[:5]):
+            # The file is decoded whole regardless, so stop parsing here (ijson raises an incomplete json error).
+            self.found = True
+            return b''
+        self._tail = chunk[-5:]
+        return chunk
+
+
+def _load_json(jsonfile: Path, size: int) -> Any:
+    """Decode a whole json file, mapping files of _MMAP_MIN_BYTES or more into memory rather than copying them.
+
+    Only orjson decodes straight from the memory map.  Streaming takes precedence: while ijson is installed,
+    address_json only decodes files of _STREAM_MIN_BYTES or more whole when the stream parser would address them
+    differently.
+
+    """
+    with open(jsonfile, 'rb') as jb:
+        if orjson is not None and size >= _MMAP_MIN_BYTES:
+            with mmap.mmap(jb.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                return json_loads(view)
+        return json_loads(jb.read())
+
 
-    for k, v in j_dict.items():
-        for address, value in value_drilldown(k, v):
-            yield AddressedValue(address, value)
+def json_loads(data: Union[bytes, memoryview]) -> Any:
+    """Decode json bytes with orjson, falling back to the json module for documents orjson would decode differently.
 
+    orjson raises on NaN/Infinity, out of range floats and lone surrogate escapes, and turns ints beyond 64 bits into
+    floats, where json decodes all of these exactly.  So documents written by json.dumps always decode back.
 
-def value_drilldown(key_address: Union[Keys, List[Keys]], value: JsonValues) \
+    """
+    if orjson is not None and not _has_wide_int(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(bytes(data))
+
+
+def _has_wide_int(data: Union[bytes, memoryview]) -> bool:
+    """Check json bytes for integer tokens outside orjson's int range."""
+    size = len(data)
+    for chunk_start in range(0, size, _SCAN_BYTES):
+        # Chunks overlap, so runs crossing a chunk boundary are found whole in one of them.
+        zeroed = bytes(data[chunk_start:chunk_start + _SCAN_BYTES + len(_LONG_DIGIT_RUN) - 1]).translate(_ZERO_DIGITS)
+        found = zeroed.find(_LONG_DIGIT_RUN)
+        while found >= 0:
+            start = end = chunk_start + found
+            while start and data[start - 1] in _DIGITS:
+                start -= 1
+            while end < size and data[end] in _DIGITS:
+                end += 1
+            # Matches the run (and its sign) only if it is a whole integer token.
+            long_int = _LONG_INT.search(data, max(start - 1, 0), end + 1)
+            if long_int is not None and not _ORJSON_INT_MIN <= int(long_int.group()) <= _ORJSON_INT_MAX:
+                return True
+            found = zeroed.find(_LONG_DIGIT_RUN, end - chunk_start)
+    return False
+
+
+def value_drilldown(key_address: Union[Keys, List[Keys], Address], value: JsonValues) \
         -> Iterator[Tuple[Address, Values]]:
-    """Recursively drill down into input values, append key lists, until json non-iterable is found.
+    """Drill down into input values, extending key addresses, until json non-iterables are found.
+
+    Nested containers are walked with an explicit stack rather than recursion, so nesting depth is not bound by the
+    interpreter recursion limit.  Values are yielded in document order.  Exact json types, as json decoders produce,
+    are matched first; subclasses (e.g. OrderedDict) are then handled like their json type, while other non-json
+    values (e.g. tuples) are skipped.  Property names are interned, so addresses from different documents share key
+    strings and compare by identity.
 
     Args:
-        key_address: str, int, or list of those that
+        key_address: str, int, or list/tuple of those, addressing the input value
         value:       json property value or array element
 
-    Returns:
+    Yields:
         Tuple of json property names and/or array indices, along with json non-iterable value.
 
     """
     if isinstance(key_address, (int, str)):
-        key_address = [key_address]
-    if isinstance(value, (bool, float, int, str, type(None))):
-        new_key = tuple(key_address)
-        yield new_key, value
-    elif isinstance(value, list):
-        for cnt, sub_value in enumerate(value):
-            sub_address = key_address + [cnt]
-            yield from value_drilldown(sub_address, sub_value)
-    elif isinstance(value, dict):
-        for key, sub_value in value.items():
-            sub_address = key_address + [key]
-            yield from value_drilldown(sub_address, sub_value)
+        address: Address = (key_address,)
+    else:
+        address = tuple(key_address)
+    stack: List[Tuple[Address, Any]] = [(address, value)]
+    while stack:
+        address, node = stack.pop()
+        node_type = type(node)
+        if node_type in _LEAF_TYPES:
+            yield address, node
+        elif node_type is list or (node_type is not dict and isinstance(node, list)):
+            stack.extend((address + (cnt,), node[cnt]) for cnt in range(len(node) - 1, -1, -1))
+        elif node_type is dict or isinstance(node, dict):
+            stack.extend((address + (sys.intern(key) if type(key) is str else key,), sub_value)
+                         for key, sub_value in reversed(node.items()))
+        elif isinstance(node, _LEAF_BASES):
+            yield address, node
+
+
+def stream_drilldown(jsonstream: BinaryIO) -> Iterator[AddressedValue]:
+    """Incrementally parse a json byte stream, tracking the current address, and yield each non-iterable value.
+
+    Args:
+        jsonstream: Binary file object of json data.
+
+    Yields:
+        AddressedValue objects, in document order.
+
+    Raises:
+        ValueError if an object repeats a property name, since values already yielded for it cannot be replaced by the
+        last one as json.load would.  ijson.JSONError for json the ijson backend cannot parse.
+
+    """
+    address:   List[Keys] = []
+    positions: List[int]  = []  # next index of each open container; -1 marks an object
+    names:     List[Optional[Set[str]]] = []  # property names seen so far in each open object
+    for _, event, value in ijson.parse(jsonstream, use_float=True):
+        if positions and positions[-1] >= 0 and event != 'end_array':
+            address[-1] = positions[-1]
+            positions[-1] += 1
+        if event == 'map_key':
+            object_names = names[-1]
+            if object_names is not None:
+                if value in object_names:
+                    raise ValueError(f'Duplicate json property name: {value!r}')
+                object_names.add(value)
+            address[-1] = sys.intern(value)
+        elif event == 'start_map' or event == 'start_array':
+            address.append(-1)
+            if event == 'start_array':
+                positions.append(0)
+                names.append(None)
+            else:
+                positions.append(-1)
+                names.append(set())
+        elif event == 'end_map' or event == 'end_array':
+            address.pop()
+            positions.pop()
+            names.pop()
+        else:
+            yield AddressedValue(tuple(address), value)
 
 
 if __name__ == '__main__':
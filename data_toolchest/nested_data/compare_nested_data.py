@@ -2,72 +2,182 @@
 
 from data_toolchest.nested_data.address_nested_data import address_json, Address, AddressedValue, Keys, Values
 
+import heapq
+import os
 import sys
+import weakref
 
-from pathlib     import Path, PurePath
-from typing      import Generic, Iterable, Iterator, Set, Tuple, TypeVar, Union
+from collections import defaultdict, OrderedDict
+from functools   import lru_cache
+from pathlib     import Path, PosixPath, PurePath, PurePosixPath, PureWindowsPath, WindowsPath
+from typing      import AbstractSet, Any, Callable, DefaultDict, Dict, FrozenSet, Generic, Iterable, Iterator, List, Optional, Sequence, Set, \
+    Tuple, TypeVar, Union
 
 __all__ = ['AddressedValueSet']
 
 
-AddressSet = Set[AddressedValue]
+AddressSet       = Set[AddressedValue]
+FrozenAddressSet = FrozenSet[AddressedValue]
 
 AVS = TypeVar('AVS', bound='AddressedValueSet')
 
-AVS_Input_Arg = Union['AddressedValueSet', AddressSet, Path, str]
+AVS_Input_Arg = Union['AddressedValueSet', AddressSet, FrozenAddressSet, Path, str]
+
+
+@lru_cache(maxsize=128)
+def _load_addressed_values(json_path: str, mtime_ns: int, size: int) -> FrozenAddressSet:
+    """Parse a json file into its addressed values once per file version.
+
+    The modification time and size only key the cache, so a rewritten file is parsed again.  Edits that leave both
+    unchanged need an explicit AddressedValueSet.clear_caches().
+
+    """
+    return frozenset(address_json(json_path))
+
+
+def _intersection(addressed_datasets: Sequence[AbstractSet[AddressedValue]]) -> AddressSet:
+    """Intersect sets smallest first, so each pass probes at most the shrinking result, and stop once empty."""
+    addressed_datasets = sorted(addressed_datasets, key=len)
+    addressed_values = set(addressed_datasets[0])
+    for addressed_dataset in addressed_datasets[1:]:
+        if not addressed_values:
+            break
+        addressed_values.intersection_update(addressed_dataset)
+    return addressed_values
+
+
+# Recent set operation results, keyed on operation name and input set identities, least recently used first.  Inputs
+# are only weakly referenced: an entry is dropped as soon as any of its input sets is freed, before its id can be reused.
+_SET_OPERATION_CACHE: 'OrderedDict[Tuple[str, Tuple[int, ...]], Tuple[Tuple[weakref.ref[FrozenAddressSet], ...], FrozenAddressSet]]' = \
+    OrderedDict()
+_SET_OPERATION_CACHE_SIZE = 32
+
+
+def _set_operation(set_operation: str, addressed_datasets: Tuple[FrozenAddressSet, ...]) -> FrozenAddressSet:
+    """Perform a basic set operation of the first addressed values set with the rest, reusing recent results.
+
+    Results are cached on the identity of the input sets rather than their value: 1, 1.0 and True compare equal, so
+    value-equal sets may hold different values.  Repeat compositions over the same (cached, immutable) sets, e.g.
+    a.union(b).intersection(a), are still served from the cache.  Results that are one of the inputs (e.g. the
+    union of one set with an empty one) are not cached.
+
+    """
+    cache_key = (set_operation, tuple(map(id, addressed_datasets)))
+    cached = _SET_OPERATION_CACHE.get(cache_key)
+    if cached is not None and all(ref() is dataset for ref, dataset in zip(cached[0], addressed_datasets)):
+        _SET_OPERATION_CACHE.move_to_end(cache_key)
+        return cached[1]
+    addressed_values = _uncached_set_operation(set_operation, addressed_datasets)
+    if not any(addressed_values is dataset for dataset in addressed_datasets):
+        def evict(_: 'weakref.ref[FrozenAddressSet]') -> None:
+            _SET_OPERATION_CACHE.pop(cache_key, None)
+
+        _SET_OPERATION_CACHE[cache_key] = (tuple(weakref.ref(dataset, evict) for dataset in addressed_datasets), addressed_values)
+        if len(_SET_OPERATION_CACHE) > _SET_OPERATION_CACHE_SIZE:
+            _SET_OPERATION_CACHE.popitem(last=False)
+    return addressed_values
+
+
+def _uncached_set_operation(set_operation: str, addressed_datasets: Tuple[FrozenAddressSet, ...]) -> FrozenAddressSet:
+    """Perform a basic set operation of the first addressed values set with the rest."""
+    addressed_values, other_datasets = addressed_datasets[0], addressed_datasets[1:]
+    if set_operation == 'union':
+        if not addressed_values and len(other_datasets) == 1:
+            # e.g. AddressedValueSet(path): share the cached set parsed from the file rather than copying it.
+            return other_datasets[0]
+        # Copies the first set once and updates it with each other set in turn.
+        return addressed_values.union(*other_datasets)
+    elif set_operation == 'intersection':
+        return frozenset(_intersection(addressed_datasets))
+    elif set_operation == 'difference':
+        return addressed_values.difference(*other_datasets)
+    elif set_operation == 'symmetric_difference':
+        if len(other_datasets) == 1:
+            return addressed_values.symmetric_difference(other_datasets[0])
+        # Values found in some, but not all, datasets.  Chained XOR would instead keep odd-count values.
+        some_addressed_values = set(addressed_values)
+        some_addressed_values.update(*other_datasets)
+        some_addressed_values.difference_update(_intersection(addressed_datasets))
+        return frozenset(some_addressed_values)
+    return frozenset()
 
 
 class AddressedValueSet(Generic[AVS]):
     """Generic class for a set of addressed values from nested data structure(s).
 
-    addressed_values: Set of AddressedValue objects with address tuple of key strings or array indices, and the data value.
+    addressed_values: Frozenset of AddressedValue objects with address tuple of key strings or array indices, and the data
+                      value.  Immutable, so it is shared rather than copied between objects and cached set operations.
 
     """
     def __init__(self, *args: AVS_Input_Arg) -> None:
         """Ensure input data is a list of paths, and generate set of uniquely addressed values if not input."""
-        self.addressed_values: AddressSet = set()
+        self._addressed_values: FrozenAddressSet = frozenset()
+        self._value_index: Optional[Dict[Tuple[type, Values], List[Tuple[Address, Values]]]] = None
+        self._key_index: Optional[Dict[Keys, List[Tuple[Address, Values]]]] = None
         if args:
             # if len(args)
             self.addressed_values = self._addressedvalueset_logic(args, 'union').addressed_values
 
+    @property
+    def addressed_values(self) -> FrozenAddressSet:
+        """Frozenset of AddressedValue objects.  Assigning a new set (frozen if need be) resets values derived from it."""
+        return self._addressed_values
+
+    @addressed_values.setter
+    def addressed_values(self, addressed_values: AbstractSet[AddressedValue]) -> None:
+        self._addressed_values = frozenset(addressed_values)
+        self._value_index = None
+        self._key_index = None
+
     def __iter__(self) -> Iterator[Tuple[Address, Values]]:
-        """Handle calls to iterate on this object.  Yields from self.addressed_values."""
-        for adv in self.addressed_values:
-            yield adv.address, adv.value
+        """Handle calls to iterate on this object.  Iterates the AddressedValue (address, value) tuples directly."""
+        return iter(self._addressed_values)
 
     def __str__(self) -> str:
         """Provide string representation of object's addressed_values."""
         adv_list = ',\n'.join([str(adv[:]) for adv in sorted(self.addressed_values)])
         return f'{{{adv_list}}}'
 
+    def preview(self, limit: int = 50) -> str:
+        """Provide string representation of only the first (in sorted order) limit addressed_values.
+
+        Selects with a bounded heap rather than sorting the whole set, so large sets preview in O(N log limit).
+
+        """
+        adv_list = ',\n'.join([str(adv[:]) for adv in heapq.nsmallest(limit, self.addressed_values)])
+        if len(self.addressed_values) > limit:
+            adv_list += ',\n...'
+        return f'{{{adv_list}}}'
+
     def _addressedvalueset_logic(self, dataset: Iterable[AVS_Input_Arg], set_operation: str) -> 'AddressedValueSet':
         """Perform basic set operations self.addressed_values set with input dataset addressed_values sets."""
-        new_addressed_datasets: list = list(self.get_addressedvalue_sets(dataset))
-        addressed_values = set()
-        if set_operation == 'union':
-            addressed_values = self.addressed_values.union(*new_addressed_datasets)
-        elif set_operation == 'intersection':
-            addressed_values = self.addressed_values.intersection(*new_addressed_datasets)
-        elif set_operation == 'difference':
-            addressed_values = self.addressed_values.difference(*new_addressed_datasets)
-        elif set_operation == 'symmetric_difference':
-            union_addressed_values = self.addressed_values.union(*new_addressed_datasets)
-            intersection_addressed_values = self.addressed_values.intersection(*new_addressed_datasets)
-            addressed_values = union_addressed_values.difference(intersection_addressed_values)
+        # Repeated input datasets cannot change any result, so drop them (order kept) before the set operation.
+        new_addressed_datasets = tuple(dict.fromkeys(frozenset(ds) for ds in self.get_addressedvalue_sets(dataset)))
+        addressed_values = _set_operation(set_operation, (self.addressed_values, *new_addressed_datasets))
         new_avs: AddressedValueSet = AddressedValueSet()
         new_avs.addressed_values = addressed_values
         return new_avs
         # return AddressedValueSet(addressed_values)
 
     @staticmethod
-    def get_addressedvalue_sets(input_data: Iterable[AVS_Input_Arg]) -> Iterator[AddressSet]:
+    def clear_caches() -> None:
+        """Drop the cached sets parsed from json files and the cached set operation results, freeing their memory.
+
+        Files are parsed again on next use, e.g. after edits that left their modification time and size unchanged.
+
+        """
+        _load_addressed_values.cache_clear()
+        _SET_OPERATION_CACHE.clear()
+
+    @staticmethod
+    def get_addressedvalue_sets(input_data: Iterable[AVS_Input_Arg]) -> Iterator[AbstractSet[AddressedValue]]:
         """Convert list of inputs to AddressedValueSet objects.
 
         Args:
               input_data: List of input nested data structures.  Can be mixed.
 
         Yields:
-             Set of AddressedValue namedtuple objects.
+             Set of AddressedValue namedtuple objects.  Sets parsed from files are cached, immutable frozensets.
 
         Raises:
             TypeError is input data is not of specific type.
@@ -76,15 +186,10 @@ class AddressedValueSet(Generic[AVS]):
         if not isinstance(input_data, tuple):
             input_data = tuple(input_data)
         for data in input_data:
-            if isinstance(data, (PurePath, str)):
-                # TODO: look into parsers to address other nested data structures based on input file suffix.
-                yield set(address_json(data))
-            elif isinstance(data, AddressedValueSet):
-                yield data.addressed_values
-            elif isinstance(data, set) and all(isinstance(d, AddressedValue) for d in data):
-                yield data
-            else:
-                raise TypeError
+            handler = _INPUT_HANDLERS.get(type(data))
+            if handler is None:
+                handler = _input_handler(data)
+            yield handler(data)
 
     def addresses(self) -> Set[Address]:
         """Find the set of unique addresses in the addressed_value set. Like addresses with different values will be combined.
@@ -112,19 +217,81 @@ class AddressedValueSet(Generic[AVS]):
         return self._addressedvalueset_logic(args, 'symmetric_difference')
 
     def find_address_with_key(self, key: Keys) -> Iterator[Tuple[Address, Values]]:
-        """Find any addressed_values that contain the input key."""
-        for address, value in self:
-            if key in address:
-                yield address, value
+        """Find any addressed_values that contain the input key.
+
+        The first search indexes all values by each key in their address, so each later search only touches its own
+        matches.
+
+        """
+        if self._key_index is None:
+            key_index: DefaultDict[Keys, List[Tuple[Address, Values]]] = defaultdict(list)
+            for adv in self._addressed_values:
+                for address_key in set(adv.address):
+                    key_index[address_key].append(adv)
+            self._key_index = dict(key_index)
+        yield from self._key_index.get(key, ())
 
     def find_value(self, result: Values) -> Iterator[Tuple[Address, Values]]:
-        """Find any addressed_values that contain the input key."""
-        result_type = type(result)
-        for address, value in self:
-            if type(value) != result_type:
-                continue
-            elif value == result:
-                yield address, value
+        """Find any addressed_values that contain the input value, of the same type.
+
+        The first search indexes all values by (type, value), so each later search only touches its own matches.
+
+        """
+        if self._value_index is None:
+            value_index: DefaultDict[Tuple[type, Values], List[Tuple[Address, Values]]] = defaultdict(list)
+            for adv in self._addressed_values:
+                value = adv.value
+                value_index[(type(value), value)].append(adv)
+            self._value_index = dict(value_index)
+        yield from self._value_index.get((type(result), result), ())
+
+
+def _addressed_values_from_path(data: Union[PurePath, str]) -> FrozenAddressSet:
+    """Retrieve the (cached) addressed values parsed from a json file path."""
+    # TODO: look into parsers to address other nested data structures based on input file suffix.
+    stat = os.stat(data)
+    return _load_addressed_values(os.path.abspath(data), stat.st_mtime_ns, stat.st_size)
+
+
+def _addressed_values_from_avs(data: AddressedValueSet) -> FrozenAddressSet:
+    """Retrieve the addressed values of an AddressedValueSet."""
+    return data.addressed_values
+
+
+def _addressed_values_from_set(data: AbstractSet[AddressedValue]) -> AbstractSet[AddressedValue]:
+    """Pass through a set of AddressedValue objects; element types are only checked when not run optimized (-O)."""
+    if __debug__ and not all(isinstance(d, AddressedValue) for d in data):
+        raise TypeError
+    return data
+
+
+# Input handlers keyed on exact input type, for get_addressedvalue_sets.  Fixed at import: other subclasses of handled
+# types resolve through _input_handler on every call, so arbitrary input types never grow this dict.
+_INPUT_HANDLERS: Dict[type, Callable[[Any], AbstractSet[AddressedValue]]] = {
+    str:               _addressed_values_from_path,
+    PurePath:          _addressed_values_from_path,
+    PurePosixPath:     _addressed_values_from_path,
+    PureWindowsPath:   _addressed_values_from_path,
+    Path:              _addressed_values_from_path,
+    PosixPath:         _addressed_values_from_path,
+    WindowsPath:       _addressed_values_from_path,
+    AddressedValueSet: _addressed_values_from_avs,
+    set:               _addressed_values_from_set,
+    frozenset:         _addressed_values_from_set,
+}
+
+
+def _input_handler(data: Any) -> Callable[[Any], AbstractSet[AddressedValue]]:
+    """Resolve the input handler for a subclass of a handled type, e.g. a user defined str or set subclass.
+
+    Raises:
+        TypeError if input data is not of a handled type.
+
+    """
+    for handled_type, handler in _INPUT_HANDLERS.items():
+        if isinstance(data, handled_type):
+            return handler
+    raise TypeError
 
 
 if __name__ == '__main__':
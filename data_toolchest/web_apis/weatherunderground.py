@@ -8,11 +8,43 @@ import sys
 import os
 import datetime as dt
 import json
-import urllib2
+
+from concurrent.futures import ThreadPoolExecutor
+from functools          import lru_cache
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+from data_toolchest.nested_data.address_nested_data import json_loads
 
 
 _weatherrecords_json_dir = '/mnt/production_storage/sequencing/ops/metadata/misc/weather_jsons/'
 _weatherunderground_key  = 'a684b2fcb86e3f53'
+_fetch_workers           = 8
+
+# Shared keep-alive session, so repeated api requests reuse pooled connections instead of reconnecting.
+_http_session = requests.Session()
+_http_session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=_fetch_workers))
+
+
+@lru_cache(maxsize=4096)
+def _parse_datetag(datetag):
+    """Convert a YYYYMMDD datetag to a datetime by slicing, avoiding the much slower strptime.
+
+    Raises:
+        ValueError if datetag is not exactly 8 digits, as strptime('%Y%m%d') would for e.g. '201612071'.
+
+    """
+    if not (len(datetag) == 8 and datetag.isdigit()):
+        raise ValueError('datetag %r does not match format YYYYMMDD' % (datetag,))
+    return dt.datetime(int(datetag[:4]), int(datetag[4:6]), int(datetag[6:8]))
+
+
+@lru_cache(maxsize=4096)
+def _format_datetag(dtobj):
+    """Convert a date or datetime to a YYYYMMDD datetag, avoiding strftime."""
+    return '%04d%02d%02d' % (dtobj.year, dtobj.month, dtobj.day)
 
 
 class Weather_Data_Dict:
@@ -25,6 +57,7 @@ class Weather_Data_Dict:
         self.currdate = dt.datetime.now().date()
 
         self.datedict = self._retrieve_local_records(records_dirpath)
+        self._dirty   = set()  # datetags fetched since the last commit to json files
 
     def fetch_datedict(self, datetag):
         """Fetch data."""
@@ -34,52 +67,57 @@ class Weather_Data_Dict:
             date_dict = self._retrieve_online_daterecord(datetag)
             if date_dict != {}:
                 self.datedict[datetag] = date_dict
+                self._dirty.add(datetag)
                 self._commit_datedict_to_jsons()
         return date_dict
 
     def massfetch_online_records(self, goback_daylim=30):
         """Mass fetch data."""
         if self.datedict != {}:
-            oldest_dtobj = self._datetag_to_dtobj(sorted(self.datedict.keys())[0])
+            oldest_dtobj = self._datetag_to_dtobj(min(self.datedict))
         else:
             oldest_dtobj = self.currdate
-        for days_adjust in range(1, goback_daylim):
-            datetag_to_fetch = self._dtobj_to_datetag(oldest_dtobj, days_adjust * -1)
-            date_dict = self._retrieve_online_daterecord(datetag_to_fetch)
-            if date_dict != {}:
-                print(datetag_to_fetch)
-                self.datedict[datetag_to_fetch] = date_dict
+        datetags_to_fetch = [self._dtobj_to_datetag(oldest_dtobj, days_adjust * -1)
+                             for days_adjust in range(1, goback_daylim)]
+        # Requests are I/O bound, so run them concurrently; map() still returns records in datetag order.
+        with ThreadPoolExecutor(max_workers=_fetch_workers) as executor:
+            date_dicts = executor.map(self._retrieve_online_daterecord, datetags_to_fetch)
+            for datetag_to_fetch, date_dict in zip(datetags_to_fetch, date_dicts):
+                if date_dict != {}:
+                    print(datetag_to_fetch)
+                    self.datedict[datetag_to_fetch] = date_dict
+                    self._dirty.add(datetag_to_fetch)
 
         self._commit_datedict_to_jsons()
 
     def _datetag_to_dtobj(self, datetag, days_adjust=0):
-        dtobj = dt.datetime.strptime(datetag, '%Y%m%d')
+        dtobj = _parse_datetag(datetag)
         adj_dtobj = dtobj + dt.timedelta(days=int(days_adjust))
         return adj_dtobj
 
     def _dtobj_to_datetag(self, dtobj, days_adjust=0):
         adj_dtobj = dtobj + dt.timedelta(days=int(days_adjust))
-        return adj_dtobj.strftime('%Y%m%d')
-        # return '%d%02d%02d'%(adj_dtobj.year,adj_dtobj.month,adj_dtobj.day)
+        return _format_datetag(adj_dtobj)
 
     def _retrieve_online_daterecord(self, datetag):
         url_str = 'http://api.wunderground.com/api/%s/history_%s/q/MI/Ann_Arbor.json' % (_weatherunderground_key,
                                                                                          datetag)
         try:
-            f         = urllib2.urlopen(url_str)
-            json_dict = json.loads(f.read())
-            f.close()
-            return json_dict
+            response = _http_session.get(url_str, timeout=10)
+            response.raise_for_status()
+            return json_loads(response.content)
         except Exception:
-            sys.stderr.write('[ERROR] Failed to retrieve %s data from web resource')
+            sys.stderr.write('[ERROR] Failed to retrieve %s data from web resource\n' % datetag)
             return {}
 
     def _retrieve_local_records(self, records_dirpath):
         local_records_dict = {}
-        json_datelt = [f.replace('.json', '') for f in os.listdir(records_dirpath)
-                       if os.path.splitext(f)[-1] == '.json']
-        for datetag in json_datelt:
-            local_date_record = self._retrieve_json(datetag)
+        with os.scandir(records_dirpath) as entries:
+            json_datelt = [entry.name[:-5] for entry in entries if entry.name.endswith('.json')]
+        # File reads release the GIL, so overlap them across threads; map() keeps records in listing order.
+        with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+            local_date_records = list(executor.map(self._retrieve_json, json_datelt))
+        for datetag, local_date_record in zip(json_datelt, local_date_records):
             if local_date_record == {}:
                 continue
             else:
@@ -94,9 +132,9 @@ class Weather_Data_Dict:
             return {}
         else:
             try:
-                f = open(json_fnpath, 'rb')
-                json_dict = json.load(f)
-                f.close()
+                # Unbuffered: read() goes straight to one fstat-sized readall, bypassing BufferedReader.
+                with open(json_fnpath, 'rb', buffering=0) as f:
+                    json_dict = json_loads(f.read())
             except Exception:
                 sys.stderr.write('<WARNING> Failure retrieving json file:%s\n' % json_fnpath)
                 return {}
@@ -110,15 +148,15 @@ class Weather_Data_Dict:
         if datedict == {}:
             sys.stderr.write('<WARNING> Empty results = json file NOT produced:%s\n' % json_fnpath)
             return False
-        f = open(json_fnpath, 'wb')
-        json.dump(datedict, f)
-        f.flush()
-        f.close()
+        with open(json_fnpath, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(datedict))
         return True
 
     def _commit_datedict_to_jsons(self):
-        for datetag, datedict in self.datedict.items():
-            self._write_json(datetag, datedict)
+        """Write json files for records fetched since the last commit; records loaded from disk are already there."""
+        for datetag in sorted(self._dirty):
+            self._write_json(datetag, self.datedict[datetag])
+        self._dirty.clear()
 
 
 if __name__ == '__main__':
@@ -10,6 +10,7 @@ if sys.version_info[:2] < (3, 8):
 
 
 install_requires = [
+    'requests',
     'setuptools_scm'
 ]
 
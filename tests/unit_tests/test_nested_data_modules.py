@@ -2,11 +2,19 @@
 """Tests for address_json.py module."""
 
 
-from data_toolchest.nested_data.address_nested_data import address_json, AddressedValue, value_drilldown
+import json
+import random
+import weakref
+
+from data_toolchest.nested_data import address_nested_data, compare_nested_data
+from data_toolchest.nested_data.address_nested_data import address_json, AddressedValue, stream_drilldown, value_drilldown
 from data_toolchest.nested_data.compare_nested_data import AddressedValueSet
 
-from pathlib import Path
-from pytest import mark, raises
+from collections import Counter, OrderedDict
+from mmap        import mmap
+from pathlib     import Path
+from types       import SimpleNamespace
+from pytest import importorskip, mark, raises
 
 TEST_DATA = Path('tests/data/input')
 
@@ -16,6 +24,21 @@ TEST_EX3 = TEST_DATA / 'example_3.json'
 
 TEST_AVS = AddressedValueSet({AddressedValue(('test', 'str',), True)})
 
+# Valid json (per the json module) that decoders other than the json module may handle differently.
+TEST_EDGE_JSONS = [
+    '{"dup": 1, "dup": 2}',
+    '{"dup": {"x": 1}, "array": [{"k": 1}, {"k": 2}], "dup": {"y": 2}}',
+    '{"id": 123456789012345678901234567890, "neg": -9223372036854775809, "max": 18446744073709551615}',
+    '{"nan": NaN, "inf": Infinity, "ninf": -Infinity, "big": 1e400}',
+    '{"lone": "\\ud800", "pair": "\\ud83d\\ude00"}',
+    '{"plain": [1, 1.0, true, null, "s", -0.0, 1e5]}',
+]
+
+
+def drilldown_reprs(addressed_values):
+    """Represent addressed values so 1, 1.0, True and NaN values all compare exactly."""
+    return [(address, repr(value)) for address, value in addressed_values]
+
 
 @mark.parametrize('key_address, value, result',
                   [
@@ -36,6 +59,9 @@ TEST_AVS = AddressedValueSet({AddressedValue(('test', 'str',), True)})
                         (('mixed_eg', 2, 1), '2'),
                         (('mixed_eg', 2, 2, 'key_1'), True),
                         (('mixed_eg', 2, 2, 'key_2'), False)]),
+                      ('subclass_eg', OrderedDict(A=1, B=Counter(C=2)),
+                       [(('subclass_eg', 'A'), 1),
+                        (('subclass_eg', 'B', 'C'), 2)]),
                       ('failed_value', (1,), [])
                   ]
                   )
@@ -46,6 +72,15 @@ def test_value_drilldown(key_address, value, result):
     assert return_val == result
 
 
+def test_value_drilldown_deep_nesting():
+    """Test value_drilldown handles nesting deeper than the recursion limit."""
+    depth = 5000
+    value = True
+    for _ in range(depth):
+        value = [value]
+    assert list(value_drilldown('deep_eg', value)) == [(('deep_eg',) + (0,) * depth, True)]
+
+
 def test_address_json():
     """Test address_json_values function."""
     address_list = {(x, y) for x, y in address_json(TEST_EX3)}
@@ -94,6 +129,109 @@ def test_address_json():
                             (('str_float_eg',), '1.000000')}
 
 
+def test_stream_drilldown():
+    """Test stream_drilldown matches the in-memory drilldown of address_json."""
+    importorskip('ijson')
+    for test_file in (TEST_EX1, TEST_EX2, TEST_EX3):
+        with open(test_file, 'rb') as j:
+            assert list(stream_drilldown(j)) == list(address_json(test_file))
+
+
+def test_address_json_edge_cases(tmp_path):
+    """Test address_json decodes wide ints, NaN/Infinity and lone surrogates exactly as the json module does."""
+    for cnt, edge_json in enumerate(TEST_EDGE_JSONS):
+        test_file = tmp_path / f'edge_{cnt}.json'
+        test_file.write_text(edge_json)
+        assert drilldown_reprs(value_drilldown((), json.loads(edge_json))) == drilldown_reprs(address_json(test_file))
+    assert dict(address_json(tmp_path / 'edge_2.json'))[('id',)] == 123456789012345678901234567890
+
+
+def test_json_loads_orjson(monkeypatch):
+    """Test float-heavy documents and ints within 64 bits decode with orjson, and only wider ints fall back to json."""
+    orjson = importorskip('orjson')
+    fallbacks = []
+    monkeypatch.setattr(address_nested_data, 'json', SimpleNamespace(loads=lambda data: fallbacks.append(data) or json.loads(data)))
+    random.seed(0)
+    orjson_docs = [
+        json.dumps([random.random() for _ in range(1000)]).encode(),
+        json.dumps({'ns': 1697300000000000000, 'ns_str': '1697300000000000000', 'small': 1.2345678901234567890123e-300}).encode(),
+        b'[18446744073709551615, -9223372036854775808, 0.12345678901234567890123, 12345678901234567890.5]',
+    ]
+    for orjson_doc in orjson_docs:
+        assert orjson.loads(orjson_doc) == address_nested_data.json_loads(orjson_doc)
+    assert fallbacks == []
+    for wide_doc in (b'[18446744073709551616]', b'[-9223372036854775809]', b'{"id": 123456789012345678901234567890}'):
+        assert json.loads(wide_doc) == address_nested_data.json_loads(wide_doc)
+    assert len(fallbacks) == 3
+    monkeypatch.setattr(address_nested_data, '_SCAN_BYTES', 7)
+    assert address_nested_data._has_wide_int(memoryview(b'[0, 123456789012345678901234567890]'))
+    assert not address_nested_data._has_wide_int(memoryview(b'[0.123456789012345678901234567890, 1697300000000000000]'))
+
+
+def test_address_json_streamed(tmp_path, monkeypatch):
+    """Test address_json gives the same addressed values whether or not a file is large enough to stream."""
+    importorskip('ijson')
+    monkeypatch.setattr(address_nested_data, '_STREAM_MIN_BYTES', 0)
+    for test_file in (TEST_EX1, TEST_EX2, TEST_EX3):
+        assert address_nested_data._streams_like_decoding(test_file)
+        with open(test_file) as j:
+            assert drilldown_reprs(value_drilldown((), json.load(j))) == drilldown_reprs(address_json(test_file))
+    for cnt, edge_json in enumerate(TEST_EDGE_JSONS):
+        test_file = tmp_path / f'edge_{cnt}.json'
+        test_file.write_text(edge_json)
+        assert drilldown_reprs(value_drilldown((), json.loads(edge_json))) == drilldown_reprs(address_json(test_file))
+
+
+def test_address_json_streamed_lazily(monkeypatch):
+    """Test streamed files yield addressed values lazily, never decoding the whole file."""
+    importorskip('ijson')
+    streamed = []
+
+    def stream_spy(jsonstream):
+        for addressed_value in stream_drilldown(jsonstream):
+            streamed.append(addressed_value)
+            yield addressed_value
+
+    monkeypatch.setattr(address_nested_data, '_STREAM_MIN_BYTES', 0)
+    monkeypatch.setattr(address_nested_data, '_load_json', None)
+    monkeypatch.setattr(address_nested_data, 'stream_drilldown', stream_spy)
+    addressed_values = address_json(TEST_EX1)
+    assert [next(addressed_values)] == streamed
+    list(addressed_values)
+    assert streamed == list(value_drilldown((), json.loads(TEST_EX1.read_text())))
+
+
+def test_streams_like_decoding(tmp_path):
+    """Test the streaming pre-check rejects files ijson would address differently, incl. escapes split across reads."""
+    importorskip('ijson')
+    for cnt, edge_json in enumerate(TEST_EDGE_JSONS):
+        test_file = tmp_path / f'edge_{cnt}.json'
+        test_file.write_text(edge_json)
+        assert address_nested_data._streams_like_decoding(test_file) == (edge_json == TEST_EDGE_JSONS[-1])
+    for offset in range(65530, 65540):
+        test_file = tmp_path / f'split_{offset}.json'
+        test_file.write_text('["' + 'x' * (offset - 2) + '\\ud83d\\ude00"]')
+        assert not address_nested_data._streams_like_decoding(test_file)
+
+
+def test_address_json_mmap(monkeypatch):
+    """Test address_json decodes large files from a memory map when ijson is unavailable to stream them."""
+    importorskip('orjson')
+    mapped = []
+
+    def mmap_spy(*args, **kwargs):
+        mapped.append(args)
+        return mmap(*args, **kwargs)
+
+    monkeypatch.setattr(address_nested_data, 'ijson', None)
+    monkeypatch.setattr(address_nested_data, '_MMAP_MIN_BYTES', 0)
+    monkeypatch.setattr(address_nested_data.mmap, 'mmap', mmap_spy)
+    for test_file in (TEST_EX1, TEST_EX2, TEST_EX3):
+        with open(test_file) as j:
+            assert drilldown_reprs(value_drilldown((), json.load(j))) == drilldown_reprs(address_json(test_file))
+    assert len(mapped) == 3
+
+
 @mark.parametrize('files, addressed_values, addresses',
                   [
                       ((str(TEST_EX1),),
@@ -352,6 +490,13 @@ def test_AddressedValueSet_str():
     assert "{(('test', 'str'), True)}" == str(TEST_AVS)
 
 
+def test_AddressedValueSet_preview():
+    """Test the dataclass object preview function."""
+    assert str(TEST_AVS) == TEST_AVS.preview()
+    new_AVS = AddressedValueSet(TEST_EX1)
+    assert str(new_AVS)[1:-1].split(',\n')[:2] + ['...'] == new_AVS.preview(2)[1:-1].split(',\n')
+
+
 def test_AddressedValueSet_get_addressedvalue_sets():
     """Test the dataclass object __str__ function."""
     assert [TEST_AVS.addressed_values] == list(AddressedValueSet.get_addressedvalue_sets((TEST_AVS,)))
@@ -359,6 +504,25 @@ def test_AddressedValueSet_get_addressedvalue_sets():
         list(AddressedValueSet.get_addressedvalue_sets(3.14))
 
 
+def test_AddressedValueSet_get_addressedvalue_sets_subclass():
+    """Test subclass inputs resolve to their base type handler without being added to the handler table."""
+    class PathStr(str):
+        pass
+
+    handler_count = len(compare_nested_data._INPUT_HANDLERS)
+    first, second = AddressedValueSet.get_addressedvalue_sets((PathStr(TEST_EX1), frozenset(TEST_AVS)))
+    assert first is next(AddressedValueSet.get_addressedvalue_sets((TEST_EX1,)))
+    assert second == TEST_AVS.addressed_values
+    assert handler_count == len(compare_nested_data._INPUT_HANDLERS)
+
+
+def test_AddressedValueSet_get_addressedvalue_sets_cached():
+    """Test repeated file inputs reuse one parsed set."""
+    first, second = AddressedValueSet.get_addressedvalue_sets((TEST_EX1, str(TEST_EX1)))
+    assert first is second
+    assert first == set(address_json(TEST_EX1))
+
+
 @mark.parametrize('files, union_with, union_results',
                   [
                       (TEST_EX1, {TEST_EX2, TEST_EX3},
@@ -471,6 +635,57 @@ def test_AddressedValueSet_intersection(files, intersection_with, intersection_r
     assert intersection_results == intersection_set
 
 
+def test_AddressedValueSet_operations_cached():
+    """Test repeated set operations over the same inputs share one immutable result."""
+    first_AVS = AddressedValueSet(TEST_EX1).union(TEST_EX2).intersection(TEST_EX1)
+    second_AVS = AddressedValueSet(TEST_EX1).union(TEST_EX2).intersection(TEST_EX1)
+    assert isinstance(first_AVS.addressed_values, frozenset)
+    assert first_AVS.addressed_values is second_AVS.addressed_values
+    assert set(first_AVS) == set(AddressedValueSet(TEST_EX1))
+
+
+def test_AddressedValueSet_operations_equal_values():
+    """Test cached set operations never swap 1, True and 1.0 values, which compare and hash equal."""
+    for value in (1, True, 1.0, True, 1):
+        new_AVS = AddressedValueSet({AddressedValue(('x',), value)})
+        assert [repr(value)] == [repr(adv.value) for adv in new_AVS]
+        assert [(('x',), value)] == list(new_AVS.find_value(value))
+        assert [repr(value)] == [repr(adv.value) for adv in new_AVS.union(new_AVS)]
+
+
+def test_AddressedValueSet_operations_cache_weak():
+    """Test cached set operations neither keep their inputs alive nor cache single set constructions."""
+    cache = compare_nested_data._SET_OPERATION_CACHE
+    cache_size = len(cache)
+    big_AVS = AddressedValueSet({AddressedValue(('n', cnt), cnt) for cnt in range(1000)})
+    assert cache_size == len(cache)
+    union_AVS = big_AVS.union(TEST_AVS)
+    assert cache_size + 1 == len(cache)
+    big_ref = weakref.ref(big_AVS.addressed_values)
+    del big_AVS
+    assert big_ref() is None
+    assert cache_size == len(cache)
+    assert 1001 == len(union_AVS.addressed_values)
+    AddressedValueSet.clear_caches()
+    assert not cache
+
+
+def test_AddressedValueSet_repeated_inputs():
+    """Test repeated input datasets do not change set operation results."""
+    new_AVS = AddressedValueSet(TEST_EX1)
+    for set_operation in ('union', 'intersection', 'difference', 'symmetric_difference'):
+        assert set(getattr(new_AVS, set_operation)(TEST_EX2)) == set(getattr(new_AVS, set_operation)(TEST_EX2, str(TEST_EX2)))
+
+
+def test_AddressedValueSet_intersection_disjoint():
+    """Test the dataclass object intersection function on disjoint and overlapping AddressedValueSets."""
+    other_AVS = AddressedValueSet({AddressedValue(('other', 'str',), False)})
+    assert set() == set(TEST_AVS.intersection(other_AVS))
+    assert set(TEST_AVS) == set(TEST_AVS.intersection(AddressedValueSet(TEST_AVS, other_AVS)))
+    with raises(TypeError):
+        TEST_AVS.intersection(other_AVS, 3.14)
+
+
 @mark.parametrize('files, difference_with, difference_results',
                   [
                       (TEST_EX1, TEST_EX2,
@@ -646,5 +861,14 @@ def test_AddressedValueSet_finds():
     """Test the dataclass object find functions."""
     assert [AddressedValue(('test', 'str'), True)] == list(TEST_AVS.find_address_with_key('test'))
     assert [] == list(TEST_AVS.find_address_with_key('not_there'))
+    assert {(('object_eg', 'bool_eg'), False),
+            (('object_eg', 'float_eg'), 1.618),
+            (('object_eg', 'int_eg'), 1),
+            (('object_eg', 'str_eg'), 'tier1 object-changed value')} == set(AddressedValueSet(TEST_EX2).find_address_with_key('object_eg'))
     assert [AddressedValue(('test', 'str'), True)] == list(TEST_AVS.find_value(True))
     assert [] == list(TEST_AVS.find_value(1))
+    new_AVS = AddressedValueSet(TEST_EX1)
+    assert {(('array_eg', 0), 1), (('object_eg', 'int_eg'), 1)} == set(new_AVS.find_value(1))
+    new_AVS.addressed_values = set(TEST_AVS.addressed_values)
+    assert [] == list(new_AVS.find_value(1))
+    assert [AddressedValue(('test', 'str'), True)] == list(new_AVS.find_value(True))
@@ -0,0 +1,94 @@
+# type: ignore
+"""Tests for weatherunderground.py module."""
+
+
+import datetime as dt
+import json
+import math
+
+from data_toolchest.web_apis import weatherunderground
+from data_toolchest.web_apis.weatherunderground import _format_datetag, _parse_datetag, Weather_Data_Dict
+
+from types  import SimpleNamespace
+from pytest import fixture, mark, raises
+
+
+TEST_RECORD = {'history': {'observations': [{'date': '20161207', 'dewptm': '-3.0', 'tempm': float('nan')}]}}
+
+
+@fixture
+def fetched(monkeypatch):
+    """Replace the api session with one returning TEST_RECORD, except for datetags ending in 0; list the datetags fetched."""
+    fetched_datetags = []
+
+    def fake_get(url_str, timeout):
+        datetag = url_str.split('history_')[1].split('/')[0]
+        fetched_datetags.append(datetag)
+        if datetag.endswith('0'):
+            raise ConnectionError(datetag)
+        return SimpleNamespace(raise_for_status=lambda: None, content=json.dumps(TEST_RECORD).encode())
+
+    monkeypatch.setattr(weatherunderground, '_http_session', SimpleNamespace(get=fake_get))
+    return fetched_datetags
+
+
+@fixture
+def records_dir(tmp_path):
+    """Directory holding one indented json record, 20161207, alongside non-json and broken json files."""
+    (tmp_path / '20161207.json').write_text(json.dumps(TEST_RECORD, indent=1))
+    (tmp_path / '20161206.txt').write_text('not a record')
+    (tmp_path / 'broken.json').write_text('{"history": ')
+    return tmp_path
+
+
+@mark.parametrize('datetag', ['201612071', '2016127', '2016-1-7', '2016120a', ''])
+def test_parse_datetag_malformed(datetag):
+    """Test datetags that are not exactly 8 digits are rejected, as by strptime."""
+    with raises(ValueError):
+        _parse_datetag(datetag)
+
+
+@mark.parametrize('datetag', ['20161207', '20000229', '19991231', '20170101'])
+def test_datetag_round_trip(datetag):
+    """Test parsing and formatting datetags matches strptime/strftime and round trips."""
+    dtobj = _parse_datetag(datetag)
+    assert dtobj == dt.datetime.strptime(datetag, '%Y%m%d')
+    assert datetag == _format_datetag(dtobj) == _format_datetag(dtobj.date()) == dtobj.strftime('%Y%m%d')
+
+
+def test_retrieve_local_records(records_dir):
+    """Test only readable json records are loaded, and NaN values written by json.dumps load back."""
+    wu_obj = Weather_Data_Dict(str(records_dir))
+    assert ['20161207'] == list(wu_obj.datedict)
+    assert math.isnan(wu_obj.datedict['20161207']['history']['observations'][0]['tempm'])
+    assert not wu_obj._dirty
+
+
+def test_fetch_datedict(records_dir, fetched):
+    """Test only fetched records are written to json files, and failed fetches are neither kept nor written."""
+    local_json = (records_dir / '20161207.json').read_text()
+    wu_obj = Weather_Data_Dict(str(records_dir))
+    assert wu_obj.fetch_datedict('20161207') is wu_obj.datedict['20161207']
+    assert [] == fetched
+    assert {} == wu_obj.fetch_datedict('20161130')
+    assert not (records_dir / '20161130.json').exists()
+    wu_obj.fetch_datedict('20161208')
+    assert ['20161130', '20161208'] == fetched
+    assert local_json == (records_dir / '20161207.json').read_text()
+    assert '20161208' in Weather_Data_Dict(str(records_dir)).datedict
+    assert not wu_obj._dirty
+
+
+def test_massfetch_online_records(records_dir, fetched):
+    """Test mass fetching goes back from the oldest record, and commits only the records it fetched."""
+    local_json = (records_dir / '20161207.json').read_text()
+    wu_obj = Weather_Data_Dict(str(records_dir))
+    wu_obj.massfetch_online_records(goback_daylim=9)
+    # Fetched concurrently, so in no set order.
+    assert {'20161206', '20161205', '20161204', '20161203', '20161202', '20161201', '20161130', '20161129'} == set(fetched)
+    assert local_json == (records_dir / '20161207.json').read_text()
+    assert set(fetched) - {'20161130'} == {path.stem for path in records_dir.glob('*.json')} - {'20161207', 'broken'}
+    reloaded = Weather_Data_Dict(str(records_dir)).datedict
+    assert set(reloaded) == set(wu_obj.datedict) == set(fetched) - {'20161130'} | {'20161207'}
+    assert math.isnan(reloaded['20161206']['history']['observations'][0]['tempm'])
+    assert not wu_obj._dirty